@@ -9,7 +9,7 @@ from pytorchocr.base_ocr_v20 import BaseOCRV20
 
 class PPOCRv2DetConverter(BaseOCRV20):
     def __init__(self, config, paddle_pretrained_model_path, **kwargs):
-        super(PPOCRv2DetConverter, self).__init__(config, **kwargs)
+        super(PPOCRv2DetConverter, self).__init__(config, init_weights=False, **kwargs)
         self.load_paddle_weights(paddle_pretrained_model_path)
         self.net.eval()
 
@@ -15,7 +15,7 @@ class PPOCRv3RecConverter(BaseOCRV20):
         # print('out_channels: ', out_channels)
         print(type(kwargs), kwargs)
         # kwargs['out_channels'] = out_channels
-        super(PPOCRv3RecConverter, self).__init__(config, **kwargs)
+        super(PPOCRv3RecConverter, self).__init__(config, init_weights=False, **kwargs)
         # self.load_paddle_weights(paddle_pretrained_model_path)
         self.load_paddle_weights([para_state_dict, opti_state_dict])
         print('model is loaded: {}'.format(paddle_pretrained_model_path))
@@ -5,7 +5,7 @@ from collections import OrderedDict
 import numpy as np
 import cv2
 import torch
-from pytorchocr.base_ocr_v20 import BaseOCRV20
+from pytorchocr.base_ocr_v20 import BaseOCRV20, count_dict_lines
 
 class PPOCRv4RecConverter(BaseOCRV20):
     def __init__(self, config, paddle_pretrained_model_path, **kwargs):
@@ -15,7 +15,7 @@ class PPOCRv4RecConverter(BaseOCRV20):
         print('out_channels: ', out_channels)
         print(type(kwargs), kwargs)
         kwargs['out_channels'] = out_channels
-        super(PPOCRv4RecConverter, self).__init__(config, **kwargs)
+        super(PPOCRv4RecConverter, self).__init__(config, init_weights=False, **kwargs)
         self.load_paddle_weights([para_state_dict, opti_state_dict])
         print('model is loaded: {}'.format(paddle_pretrained_model_path))
         self.net.eval()
@@ -71,17 +71,12 @@ def read_network_config_from_yaml(yaml_path):
         char_dict_path = os.path.abspath(res['Global']['character_dict_path'])
         if not os.path.exists(char_dict_path):
             raise FileNotFoundError('{} is not existed.'.format(char_dict_path))
-        character_str = []
-        with open(char_dict_path, "rb") as fin:
-            lines = fin.readlines()
-            for line in lines:
-                line = line.decode('utf-8').strip("\n").strip("\r\n")
-                character_str.append(line)
+        char_num = count_dict_lines(char_dict_path, os.path.getmtime(char_dict_path))
         use_space_char = res['Global']['use_space_char']
         if use_space_char:
-            character_str.append(" ")
-        character_str = ['blank'] + character_str
-        char_num = len(character_str)
+            char_num += 1
+        # ctc blank
+        char_num += 1
         res['Architecture']['Head']['out_channels_list'] = {
             'CTCLabelDecode': char_num,
             'SARLabelDecode': char_num + 2,
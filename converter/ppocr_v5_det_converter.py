@@ -4,7 +4,7 @@ from collections import OrderedDict
 import numpy as np
 import cv2
 import torch
-from pytorchocr.base_ocr_v20 import BaseOCRV20
+from pytorchocr.base_ocr_v20 import BaseOCRV20, paddle_key_to_pytorch
 
 def print_cmp(inp, name=None):
     print('{}: shape-{}, sum: {}, mean: {}, max: {}, min: {}'.format(name, inp.shape,
@@ -13,7 +13,7 @@ def print_cmp(inp, name=None):
 
 class PPOCRv5DetConverter(BaseOCRV20):
     def __init__(self, config, paddle_pretrained_model_path, **kwargs):
-        super(PPOCRv5DetConverter, self).__init__(config, **kwargs)
+        super(PPOCRv5DetConverter, self).__init__(config, init_weights=False, **kwargs)
         self.load_paddle_weights(paddle_pretrained_model_path)
         self.net.eval()
 
@@ -27,14 +27,13 @@ class PPOCRv5DetConverter(BaseOCRV20):
             import paddle
             para_state_dict = paddle.load(weights_path)
 
+        pytorch_state_dict = self.net.state_dict()
         for k,v in para_state_dict.items():
 
             if k.endswith('num_batches_tracked'):
                 continue
 
-            ptname = k
-            ptname = ptname.replace('._mean', '.running_mean')
-            ptname = ptname.replace('._variance', '.running_var')
+            ptname = paddle_key_to_pytorch(k)
 
             # if 'backbone.conv1.hardswish.scale' in k:
             #     continue
@@ -43,9 +42,10 @@ class PPOCRv5DetConverter(BaseOCRV20):
             #     continue
 
             try:
-                self.net.state_dict()[ptname].copy_(torch.Tensor(v.cpu().numpy()))
+                # wrap the numpy array without another copy, copy_ casts the dtype itself
+                pytorch_state_dict[ptname].copy_(torch.from_numpy(v.cpu().numpy()))
             except Exception as e:
-                print('pytorch: {}, {}'.format(ptname, self.net.state_dict()[ptname].size()))
+                print('pytorch: {}, {}'.format(ptname, pytorch_state_dict[ptname].size()))
                 print('paddle: {}, {}'.format(k, v.shape))
                 raise e
         print('model is loaded: {}'.format(weights_path))
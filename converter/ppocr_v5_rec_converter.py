@@ -1,132 +1,259 @@
 # https://zhuanlan.zhihu.com/p/335753926
 import os, sys
+import itertools
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import cv2
 import torch
-from pytorchocr.base_ocr_v20 import BaseOCRV20
+from torch.utils.dlpack import from_dlpack
+from pytorchocr.base_ocr_v20 import BaseOCRV20, LazyNDArray, TORCH_GE_2_1, count_dict_lines, paddle_key_to_pytorch
 
 def print_cmp(inp, name=None):
     print('{}: shape-{}, sum: {}, mean: {}, max: {}, min: {}'.format(name, inp.shape,
                                                                      np.sum(inp), np.mean(inp),
                                                                      np.max(inp), np.min(inp)))
 
+def paddle_to_numpy(v):
+    # view the memory of a cpu paddle tensor through its buffer protocol, copy only if that fails
+    try:
+        return np.asarray(v.value().get_tensor())
+    except Exception:
+        return v.cpu().numpy()
+
+def paddle_to_torch(v):
+    # share the storage of the paddle tensor instead of copying it through numpy
+    if isinstance(v, LazyNDArray):
+        v = v.materialize()
+    if isinstance(v, np.ndarray):
+        if not v.flags.writeable:
+            # arrays on top of immutable pickled data are read-only, the model owns its tensors and may write them
+            v = v.copy()
+        return torch.from_numpy(v)
+    try:
+        import paddle
+        return from_dlpack(paddle.utils.dlpack.to_dlpack(v))
+    except Exception:
+        # e.g. non-contiguous tensors can not be exported by dlpack
+        return torch.from_numpy(paddle_to_numpy(v))
+
+def find_ctc_key(ctc_head_keys, names):
+    return next((ctc_head_keys[name] for name in names if name in ctc_head_keys), None)
+
 class PPOCRv5RecConverter(BaseOCRV20):
-    def __init__(self, config, paddle_pretrained_model_path, **kwargs):
-        para_state_dict, opti_state_dict = self.read_paddle_weights(paddle_pretrained_model_path)
-        para_state_dict = self.del_invalid_state_dict(para_state_dict)
-        out_channels = list(para_state_dict.values())[-1].shape[0]
-        print('out_channels: ', out_channels)
-        print(type(kwargs), kwargs)
-        kwargs['out_channels'] = out_channels
-        super(PPOCRv5RecConverter, self).__init__(config, **kwargs)
+    # paddle stores linear weights as [in, out], pytorch as [out, in]
+    TRANSPOSE_SUFFIXES = frozenset(['fc.weight', 'fc1.weight', 'fc2.weight', 'qkv.weight', 'proj.weight'])
+    # names inside the ctc head that give its size, by priority
+    CTC_WEIGHT_NAMES = ('fc.weight', 'fc2.weight')
+    CTC_BIAS_NAMES = ('fc.bias', 'fc2.bias')
+    # the gtc branch (decoder, positional encoding, ...) is only used in training,
+    # its keys are dropped while unpickling, before any renaming
+    SKIP_PREFIXES = ('head.gtc_head.', 'head.before_gtc')
+
+    def __init__(self, config, paddle_pretrained_model_path, device='cpu', verbose=False, **kwargs):
+        self.verbose = verbose
+        # read the checkpoint in the background while the pytorch model is built
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            reading = executor.submit(self.read_paddle_weights, paddle_pretrained_model_path,
+                                      skip_prefixes=self.SKIP_PREFIXES, lazy=True, fast=True)
+            if 'out_channels_list' not in config['Head']:
+                # the head size has to come from the checkpoint, wait for it
+                kwargs['out_channels'] = self.get_ctc_out_channels(reading.result()[0])
+            if self.verbose:
+                print(type(kwargs), kwargs)
+            super(PPOCRv5RecConverter, self).__init__(config, init_weights=False, **kwargs)
+            para_state_dict, opti_state_dict = reading.result()
+        if self.verbose:
+            print('out_channels: ', self.get_ctc_out_channels(para_state_dict))
         self.load_paddle_weights([para_state_dict, opti_state_dict])
+        self.net.to(device)
         print('model is loaded: {}'.format(paddle_pretrained_model_path))
         self.net.eval()
 
+    def build_net(self, **kwargs):
+        # every tensor is replaced by the paddle weights, build on the meta device so
+        # nothing is allocated or randomly initialized for it, load_paddle_weights then
+        # assigns them (needs torch>=2.1).
+        self.built_on_meta = False
+        if TORCH_GE_2_1:
+            with torch.device('meta'):
+                super(PPOCRv5RecConverter, self).build_net(**kwargs)
+            persistent_keys = set(self.net.state_dict().keys())
+            # non-persistent buffers are computed in __init__ and not in the checkpoint
+            self.built_on_meta = all(k in persistent_keys for k, _ in self.net.named_buffers())
+        if not self.built_on_meta:
+            super(PPOCRv5RecConverter, self).build_net(**kwargs)
 
-    def del_invalid_state_dict(self, para_state_dict):
-        new_state_dict = OrderedDict()
-        for i, (k,v) in enumerate(para_state_dict.items()):
-            if k.startswith('head.gtc_head.'):
-                continue
-
-            elif k.startswith('head.before_gtc'):
-                continue
-
-            else:
-                new_state_dict[k] = v
-        return new_state_dict
-
+    def get_ctc_out_channels(self, para_state_dict):
+        # index the ctc head keys by their name inside the head once, then look them up
+        ctc_head_keys = {k.rpartition('ctc_head.')[2]: k for k in para_state_dict if 'ctc_head.' in k}
+        weight_key = find_ctc_key(ctc_head_keys, self.CTC_WEIGHT_NAMES)
+        if weight_key is not None:
+            # paddle linear weight: [in_channels, out_channels]
+            return para_state_dict[weight_key].shape[1]
+        bias_key = find_ctc_key(ctc_head_keys, self.CTC_BIAS_NAMES)
+        if bias_key is not None:
+            return para_state_dict[bias_key].shape[0]
+        return para_state_dict[next(reversed(para_state_dict))].shape[0]
 
     def load_paddle_weights(self, paddle_weights):
         para_state_dict, opti_state_dict = paddle_weights
 
-        # [print('paddle: {} ---- {}'.format(k, v.shape)) for k, v in para_state_dict.items()]
-        # [print('pytorch: {} ---- {}'.format(k, v.shape)) for k, v in self.net.state_dict().items()]
-        # exit()
-
+        # map every paddle weight to its pytorch name, then hand them all to load_state_dict
+        # at once. on a meta built net the paddle arrays become the storage of the model
+        # (assign=True), otherwise they are copied into the built tensors.
+        pytorch_state_dict = dict(itertools.chain(self.net.named_parameters(), self.net.named_buffers()))
+        remapped_state_dict = {}
+        unmatched_paddle_keys = []
+        mapping_log = []
         for k,v in para_state_dict.items():
-            ptname = k
-            ptname = ptname.replace('._mean', '.running_mean')
-            ptname = ptname.replace('._variance','.running_var')
+            ptname = paddle_key_to_pytorch(k)
 
-            try:
-                if k.endswith('fc1.weight') or k.endswith('fc2.weight') \
-                        or k.endswith('fc.weight') or k.endswith('qkv.weight') \
-                        or k.endswith('proj.weight'):
-                    self.net.state_dict()[ptname].copy_(torch.Tensor(v.T.cpu().numpy()))
+            shape = tuple(v.shape)
+            target = pytorch_state_dict.get(ptname)
+            if target is None:
+                unmatched_paddle_keys.append((k, ptname, shape, None))
+                continue
+            transpose = '.'.join(ptname.rsplit('.', 2)[-2:]) in self.TRANSPOSE_SUFFIXES \
+                    and shape[::-1] == tuple(target.shape)
+            if not transpose and shape != tuple(target.shape):
+                unmatched_paddle_keys.append((k, ptname, shape, target))
+                continue
+            remapped_state_dict[ptname] = self.paddle_weight_to_torch(v, target, transpose)
+            if self.verbose:
+                mapping_log.append('paddle: {} {} ---- pytorch: {}{}'.format(k, shape, ptname,
+                                                                           ' (transposed)' if transpose else ''))
+        if mapping_log:
+            # one write for the whole mapping, not one per key
+            print('\n'.join(mapping_log))
+
+        if unmatched_paddle_keys:
+            error_log = []
+            for k, ptname, shape, target in unmatched_paddle_keys:
+                error_log.append('exception:')
+                if target is not None:
+                    error_log.append('pytorch: {}, {}'.format(ptname, target.size()))
                 else:
-                    self.net.state_dict()[ptname].copy_(torch.Tensor(v.cpu().numpy()))
+                    error_log.append('pytorch: {} is not existed.'.format(ptname))
+                error_log.append('paddle: {}, {}'.format(k, shape))
+            print('\n'.join(error_log))
+            k, ptname, shape, target = unmatched_paddle_keys[0]
+            if target is None:
+                raise KeyError(ptname)
+            raise ValueError('size mismatch for {}: paddle {}, pytorch {}'.format(ptname, shape,
+                                                                                tuple(target.shape)))
 
-            except Exception as e:
-                print('exception:')
-                print('pytorch: {}, {}'.format(ptname, self.net.state_dict()[k].size()))
-                print('paddle: {}, {}'.format(k, v.shape))
-                raise e
+        for name, t in pytorch_state_dict.items():
+            if name.endswith('num_batches_tracked') and name not in remapped_state_dict:
+                # paddle has no counterpart, it is only read in training without momentum
+                remapped_state_dict[name] = torch.zeros_like(t, device='cpu')
+        # a meta built net (see build_net) has no values of its own, nothing may be left out.
+        # the assign argument only exists from torch 2.1, it is not passed otherwise
+        load_kwargs = {'assign': True} if self.built_on_meta else {}
+        missing_keys, _ = self.net.load_state_dict(remapped_state_dict, strict=False, **load_kwargs)
+        if missing_keys:
+            raise KeyError('not found in paddle weights: {}'.format(', '.join(missing_keys)))
 
         print('model is loaded.')
 
+    @staticmethod
+    def paddle_weight_to_torch(v, target, transpose):
+        source = paddle_to_torch(v)
+        if transpose:
+            # keep the paddle [in, out] layout, the pytorch weight is a transposed view of it
+            source = source.t()
+        if source.dtype != target.dtype:
+            source = source.to(target.dtype)
+        return source
+
 def read_network_config_from_yaml(yaml_path):
     if not os.path.exists(yaml_path):
         raise FileNotFoundError('{} is not existed.'.format(yaml_path))
     import yaml
+    # libyaml's C loader when pyyaml was built with it
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
     with open(yaml_path, encoding='utf-8') as f:
-        res = yaml.safe_load(f)
+        res = yaml.load(f, Loader=loader)
     if res.get('Architecture') is None:
         raise ValueError('{} has no Architecture'.format(yaml_path))
     if res['Architecture']['Head']['name'] == 'MultiHead':
         char_dict_path = os.path.abspath(res['Global']['character_dict_path'])
         if not os.path.exists(char_dict_path):
             raise FileNotFoundError('{} is not existed.'.format(char_dict_path))
-        character_str = []
-        with open(char_dict_path, "rb") as fin:
-            lines = fin.readlines()
-            for line in lines:
-                line = line.decode('utf-8').strip("\n").strip("\r\n")
-                character_str.append(line)
+        char_num = count_dict_lines(char_dict_path, os.path.getmtime(char_dict_path))
         use_space_char = res['Global']['use_space_char']
         if use_space_char:
-            character_str.append(" ")
-        character_str = ['blank'] + character_str
-        char_num = len(character_str)
+            char_num += 1
+        # ctc blank
+        char_num += 1
         res['Architecture']['Head']['out_channels_list'] = {
             'CTCLabelDecode': char_num,
             'SARLabelDecode': char_num + 2,
             'NRTRLabelDecode': char_num + 3
         }
-    return res['Architecture']
+    return res['Architecture'], res.get('Global', {})
 
 if __name__ == '__main__':
     import argparse, json, textwrap, sys, os
+    from pytorchocr.utils.logging import get_logger
+    logger = get_logger()
 
     parser = argparse.ArgumentParser()
     parser.add_argument("--yaml_path", type=str, help='Assign the yaml path of network configuration', default=None)
     parser.add_argument("--src_model_path", type=str, help='Assign the paddleOCR trained model(best_accuracy)')
+    parser.add_argument("--verbose", action='store_true', help='Print the mapping of every weight')
+    parser.add_argument("--device", type=str, default='cpu', help='Device of the converted model, e.g. cuda')
+    parser.add_argument("--save_format", type=str, choices=['pth', 'safetensors'], default='pth',
+                        help='safetensors files are memory mapped when loaded, needs the safetensors package')
+    parser.add_argument("--test_inference", action='store_true', help='Run the converted model on a random input')
+    parser.add_argument("--compile", action='store_true', help='torch.compile the model for --test_inference')
+    parser.add_argument("--fast_test", action='store_true', help='Run --test_inference in fp16 autocast on cuda')
     args = parser.parse_args()
 
     yaml_path = args.yaml_path
     if yaml_path is not None:
         if not os.path.exists(yaml_path):
             raise FileNotFoundError('{} is not existed.'.format(yaml_path))
-        cfg = read_network_config_from_yaml(yaml_path)
+        cfg, global_cfg = read_network_config_from_yaml(yaml_path)
 
     else:
         raise NotImplementedError
 
-    converter = PPOCRv5RecConverter(cfg, args.src_model_path)
+    converter = PPOCRv5RecConverter(cfg, args.src_model_path, device=args.device, verbose=args.verbose)
 
-    np.random.seed(666)
-    inputs = np.random.randn(1,3,48,320).astype(np.float32)
-    inp = torch.from_numpy(inputs)
+    if args.test_inference:
+        torch.manual_seed(666)
+        image_shape = global_cfg.get('d2s_train_image_shape', [3, 48, 320])
+        device = next(converter.net.parameters()).device
+        # stage the input in pinned memory so the upload does not block the first kernel
+        inp = torch.randn(1, *image_shape, dtype=torch.float32, pin_memory=device.type == 'cuda')
+        inp = inp.to(device, non_blocking=True)
 
-    out = converter.net(inp)
-    out = out.data.numpy()
-    # print('out:', np.sum(out), np.mean(out), np.max(out), np.min(out))
+        # keep converter.net itself uncompiled, its state_dict keys are what gets saved
+        net = converter.net
+        if args.compile and hasattr(torch, 'compile'):
+            net = torch.compile(converter.net, mode='reduce-overhead')
+        # only a sanity check of the conversion, half precision is enough for it on cuda
+        autocast = torch.autocast(device_type=device.type, dtype=torch.float16,
+                                  enabled=args.fast_test and device.type == 'cuda')
+        with torch.inference_mode(), autocast:
+            try:
+                out = net(inp)
+            except Exception:
+                if net is converter.net:
+                    raise
+                logger.exception('torch.compile failed, run eagerly')
+                out = converter.net(inp)
+            if args.verbose:
+                # reduce in torch, only the scalars leave the tensor
+                out_min, out_max = torch.aminmax(out)
+                print('out: shape-{}, sum: {}, mean: {}, max: {}, min: {}'.format(
+                    tuple(out.shape), out.sum().item(), out.mean().item(), out_max.item(), out_min.item()))
 
     # save
     save_basename = os.path.basename(os.path.abspath(args.src_model_path))
-    save_name = 'ptocr_v5_{}.pth'.format(save_basename.split('PP-OCRv5_')[-1].split('_pretrained')[0])
+    save_name = 'ptocr_v5_{}.{}'.format(save_basename.split('PP-OCRv5_')[-1].split('_pretrained')[0],
+                                        args.save_format)
     converter.save_pytorch_weights(save_name)
     print('done.')
@@ -13,7 +13,7 @@ class PPStructureTableStructureConverter(BaseOCRV20):
         para_state_dict, opti_state_dict = self.read_paddle_weights(paddle_pretrained_model_path)
         print('config: ', config)
         print(type(kwargs), kwargs)
-        super(PPStructureTableStructureConverter, self).__init__(config, **kwargs)
+        super(PPStructureTableStructureConverter, self).__init__(config, init_weights=False, **kwargs)
         self.load_paddle_weights([para_state_dict, opti_state_dict])
         print('model is loaded: {}'.format(paddle_pretrained_model_path))
         self.net.eval()
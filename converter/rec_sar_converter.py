@@ -12,7 +12,7 @@ class RecSARConverter(BaseOCRV20):
         para_state_dict, opti_state_dict = self.read_paddle_weights(paddle_pretrained_model_path)
         print('config: ', config)
         print(type(kwargs), kwargs)
-        super(RecSARConverter, self).__init__(config, **kwargs)
+        super(RecSARConverter, self).__init__(config, init_weights=False, **kwargs)
         self.load_paddle_weights([para_state_dict, opti_state_dict])
         print('model is loaded: {}'.format(paddle_pretrained_model_path))
         self.net.eval()
@@ -12,9 +12,7 @@ def onnx_optim(onnxfile, save_onnxfile):
     save_dir = os.path.dirname(save_onnxpath)
     if not os.path.exists(onnx_path):
         raise FileNotFoundError('{} is not existed.'.format(onnx))
-    if not os.path.exists(save_dir):
-        os.makedirs(save_dir)
-        print('makedir: {}'.format(save_dir))
+    os.makedirs(save_dir, exist_ok=True)
     onnx_model = onnx.load(onnxfile)
     passes = ["extract_constant_to_initializer", "eliminate_unused_initializer"]
     # from onnx import optimizer # too old
@@ -60,7 +60,7 @@ class TableStructurer(BaseOCRV20):
         self.yaml_path = args.table_yaml_path
         network_config = utility.AnalysisConfig(self.weights_path, self.yaml_path)
 
-        super(TableStructurer, self).__init__(network_config, **kwargs)
+        super(TableStructurer, self).__init__(network_config, init_weights=False, **kwargs)
 
         self.load_pytorch_weights(self.weights_path)
         self.net.eval()
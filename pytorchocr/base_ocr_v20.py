@@ -1,12 +1,70 @@
 import os, sys
+import itertools
+import json
+import pickle
+import zipfile
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 import numpy as np
 import cv2
 import torch
 
 from pytorchocr.modeling.architectures.base_model import BaseModel
 
+# torch.load(mmap=True) and load_state_dict(assign=True) need torch>=2.1
+TORCH_GE_2_1 = tuple(int(v) for v in torch.__version__.split('.')[:2]) >= (2, 1)
+
+class LazyNDArray:
+    # stands in for numpy's _reconstruct while unpickling a .pdparams file,
+    # the array is only built in materialize(), filtered keys are never turned into arrays.
+    def __init__(self, reconstruct, *args):
+        self.reconstruct = reconstruct
+        self.args = args
+        self.state = None
+
+    def __setstate__(self, state):
+        self.state = state
+
+    @property
+    def shape(self):
+        return tuple(self.state[-4])
+
+    def materialize(self):
+        # numpy keeps the unpickled bytes as the (writable) buffer of the array, no copy
+        array = self.reconstruct(*self.args)
+        array.__setstate__(self.state)
+        return array
+
+
+class PaddleUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if name == '_reconstruct' and module in ('numpy.core.multiarray', 'numpy._core.multiarray'):
+            return partial(LazyNDArray, super().find_class(module, name))
+        return super().find_class(module, name)
+
+
+# paddle -> pytorch names of the last key component, one dict lookup per key
+RENAME_RULES = {
+    '_mean': 'running_mean',
+    '_variance': 'running_var',
+}
+
+def paddle_key_to_pytorch(k):
+    prefix, sep, name = k.rpartition('.')
+    new_name = RENAME_RULES.get(name)
+    return k if new_name is None else prefix + sep + new_name
+
+@lru_cache(maxsize=None)
+def count_dict_lines(char_dict_path, mtime):
+    # only the number of characters is needed, count the lines as readlines() splits
+    # them without decoding, cached per path and modification time
+    with open(char_dict_path, 'rb') as fin:
+        data = fin.read()
+    return data.count(b'\n') + (len(data) > 0 and not data.endswith(b'\n'))
+
+
 class BaseOCRV20:
     def __init__(self, config, **kwargs):
         self.config = config
@@ -14,8 +72,9 @@ class BaseOCRV20:
         self.net.eval()
 
 
-    def build_net(self, **kwargs):
-        self.net = BaseModel(self.config, **kwargs)
+    def build_net(self, init_weights=True, **kwargs):
+        # init_weights=False when a checkpoint is loaded right after the build
+        self.net = BaseModel(self.config, init_weights=init_weights, **kwargs)
 
 
     def load_paddle_weights(self, weights_path):
@@ -57,32 +116,94 @@ class BaseOCRV20:
         print('model is loaded: {}'.format(weights_path))
 
     def read_pytorch_weights(self, weights_path):
-        if not os.path.exists(weights_path):
-            raise FileNotFoundError('{} is not existed.'.format(weights_path))
-        weights = torch.load(weights_path)
+        # no exists() check before opening, a missing file fails in the open itself
+        try:
+            if weights_path.endswith('.safetensors'):
+                return self.read_safetensors(weights_path)
+            weights = self.torch_load(weights_path)
+        except FileNotFoundError:
+            raise FileNotFoundError('{} is not existed.'.format(weights_path)) from None
         return weights
 
+    @staticmethod
+    def read_safetensors(weights_path):
+        # read from a memory map of the file, no unpickling. the tensors are listed sorted
+        # by name, get_out_channels and the rec predictors read the last (head) entries,
+        # so restore the module order that save_pytorch_weights keeps in the metadata
+        from safetensors import safe_open
+        with safe_open(weights_path, framework='pt') as f:
+            metadata = f.metadata() or {}
+            keys = json.loads(metadata['keys']) if 'keys' in metadata else f.keys()
+            return {k: f.get_tensor(k) for k in keys}
+
+    @staticmethod
+    def torch_load(weights_path):
+        # map the checkpoint and page the tensors in as they are used instead of reading
+        # it all, only zipfile checkpoints can be mapped and only from torch 2.1.
+        # weights_only: the restricted unpickler, a state dict needs no other classes.
+        if TORCH_GE_2_1 and zipfile.is_zipfile(weights_path):
+            return torch.load(weights_path, map_location='cpu', mmap=True, weights_only=True)
+        return torch.load(weights_path, map_location='cpu', weights_only=True)
+
     def get_out_channels(self, weights):
-        if list(weights.keys())[-1].endswith('.weight') and len(list(weights.values())[-1].shape) == 2:
-            out_channels = list(weights.values())[-1].numpy().shape[1]
+        # only the last entry is read, no key or value lists are built
+        last_key, last_value = next(reversed(weights.items()))
+        if last_key.endswith('.weight') and len(last_value.shape) == 2:
+            out_channels = last_value.shape[1]
         else:
-            out_channels = list(weights.values())[-1].numpy().shape[0]
+            out_channels = last_value.shape[0]
         return out_channels
 
+    def copy_state_dict(self, weights):
+        # strict like nn.Module.load_state_dict, but the tensor copies run on a thread
+        # pool, copy_ releases the GIL so they are not serialized
+        state_dict = self.net.state_dict()
+        # BatchNorm itself keeps num_batches_tracked when old checkpoints lack it
+        missing_keys = [k for k in state_dict
+                        if k not in weights and not k.endswith('num_batches_tracked')]
+        unexpected_keys = [k for k in weights if k not in state_dict]
+        if missing_keys or unexpected_keys:
+            raise RuntimeError('Error(s) in loading state_dict: missing keys: {}, unexpected keys: {}'.format(
+                missing_keys, unexpected_keys))
+        pairs = [(state_dict[k], v) for k, v in weights.items()]
+        for k, (dst, src) in zip(weights, pairs):
+            # copy_ would broadcast a mismatched shape silently
+            if dst.shape != src.shape:
+                raise RuntimeError('size mismatch for {}: checkpoint {}, model {}'.format(
+                    k, tuple(src.shape), tuple(dst.shape)))
+
+        def copy(pair):
+            # grad mode is per thread
+            with torch.no_grad():
+                pair[0].copy_(pair[1])
+
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            list(executor.map(copy, pairs))
+
     def load_state_dict(self, weights):
-        self.net.load_state_dict(weights)
+        self.copy_state_dict(weights)
         print('weights is loaded.')
 
     def load_pytorch_weights(self, weights_path):
-        self.net.load_state_dict(torch.load(weights_path))
+        self.copy_state_dict(self.torch_load(weights_path))
         print('model is loaded: {}'.format(weights_path))
 
 
     def save_pytorch_weights(self, weights_path):
-        try:
-            torch.save(self.net.state_dict(), weights_path, _use_new_zipfile_serialization=False)
-        except:
-            torch.save(self.net.state_dict(), weights_path) # _use_new_zipfile_serialization=False for torch>=1.6.0
+        # state_dict() tensors are already detached, only the ones off the cpu are copied.
+        # the values are replaced in place so the dict keeps its _metadata
+        state_dict = self.net.state_dict()
+        for k, v in state_dict.items():
+            if v.device.type != 'cpu':
+                state_dict[k] = v.cpu()
+        if weights_path.endswith('.safetensors'):
+            from safetensors.torch import save_file
+            save_file({k: v.contiguous() for k, v in state_dict.items()}, weights_path,
+                      metadata={'keys': json.dumps(list(state_dict))})
+            print('model is saved: {}'.format(weights_path))
+            return
+        # zipfile format (torch>=1.6 reads it), torch_load can memory-map it
+        torch.save(state_dict, weights_path)
         print('model is saved: {}'.format(weights_path))
 
 
@@ -91,7 +212,60 @@ class BaseOCRV20:
         for k,v in self.net.state_dict().items():
             print('{}----{}'.format(k,type(v)))
 
-    def read_paddle_weights(self, weights_path):
+    def read_pickled_paddle_weights(self, weights_path, skip_prefixes=(), lazy=False):
+        # .pdparams written by paddle.save is a pickled dict of numpy arrays,
+        # unpickle it directly to skip the paddle runtime and Tensor wrapping.
+        if not weights_path.endswith('.pdparams') and os.path.exists(weights_path + '.pdparams'):
+            weights_path = weights_path + '.pdparams'
+        try:
+            f = open(weights_path, 'rb')
+        except OSError:
+            # paddle reports the missing file
+            return None
+        # the C unpickler reads the buffered file directly, the data of every array
+        # is read once into the bytes object numpy then uses as its buffer
+        with f:
+            try:
+                para_state_dict = self.unpickle_paddle_weights(f)
+            except (pickle.UnpicklingError, EOFError, ValueError) as e:
+                print('{} can not be unpickled ({}), loading it with paddle.'.format(weights_path, e))
+                return None
+        if para_state_dict is None:
+            print('{} is not a dict of arrays, loading it with paddle.'.format(weights_path))
+            return None
+        # drop skipped keys before any array is built, with lazy=True the caller
+        # materializes each LazyNDArray itself when it gets to it.
+        # the unpickled dict is kept and updated in place, it is not rebuilt.
+        self.del_skipped_keys(para_state_dict, skip_prefixes)
+        if not lazy:
+            for k, v in para_state_dict.items():
+                para_state_dict[k] = v.materialize()
+        return para_state_dict
+
+    @staticmethod
+    def unpickle_paddle_weights(f):
+        para_state_dict = PaddleUnpickler(f, encoding='latin1').load()
+        if not isinstance(para_state_dict, dict) or 'UnpackBigParamInfor@@' in para_state_dict:
+            return None
+        para_state_dict.pop('StructuredToParameterName@@', None)
+        if not all(isinstance(v, LazyNDArray) for v in para_state_dict.values()):
+            return None
+        return para_state_dict
+
+    @staticmethod
+    def del_skipped_keys(para_state_dict, skip_prefixes):
+        if skip_prefixes:
+            for k in [k for k in para_state_dict if k.startswith(skip_prefixes)]:
+                del para_state_dict[k]
+
+    def read_paddle_weights(self, weights_path, skip_prefixes=(), lazy=False, fast=False):
+        # fast=True: try read_pickled_paddle_weights first, the values are then numpy arrays
+        # (LazyNDArray with lazy=True) and opti_state_dict is None
+        skip_prefixes = tuple(skip_prefixes)
+        if fast:
+            para_state_dict = self.read_pickled_paddle_weights(weights_path, skip_prefixes, lazy)
+            if para_state_dict is not None:
+                return para_state_dict, None
         try:
             import paddle.fluid as fluid
             with fluid.dygraph.guard():
@@ -100,22 +274,33 @@ class BaseOCRV20:
             import paddle
             para_state_dict = paddle.load(weights_path)
             opti_state_dict = None
+        self.del_skipped_keys(para_state_dict, skip_prefixes)
         return para_state_dict, opti_state_dict
 
-    def print_paddle_state_dict(self, weights_path):
-        try:
-            import paddle.fluid as fluid
-            with fluid.dygraph.guard():
-                para_state_dict, opti_state_dict = fluid.load_dygraph(weights_path)
-        except:
-            import paddle
-            para_state_dict = paddle.load(weights_path)
+    def print_paddle_state_dict(self, weights_path, max_num=None):
+        # paddle is only imported if the checkpoint can not be unpickled directly
+        para_state_dict, opti_state_dict = self.read_paddle_weights(weights_path, fast=True)
+        shaped_types = (np.ndarray, LazyNDArray)
+        if 'paddle' in sys.modules:
+            # the checkpoint went through the paddle fallback
+            shaped_types += (sys.modules['paddle'].Tensor,)
         print('paddle"')
-        for k,v in para_state_dict.items():
-            print('{}----{}'.format(k,type(v)))
+        for k,v in itertools.islice(para_state_dict.items(), max_num):
+            shape = v.shape if isinstance(v, shaped_types) else 'N/A'
+            print('{}----{}----{}'.format(k,type(v),shape))
+        if max_num is not None and len(para_state_dict) > max_num:
+            print('... ({} more keys)'.format(len(para_state_dict) - max_num))
+
 
+    def compile_net(self):
+        # input sizes change per image / batch, so keep the graph dynamic. compiled graphs
+        # are kept on disk so --use_mp workers and later runs reuse them, the directory
+        # follows TORCHINDUCTOR_CACHE_DIR
+        from torch._inductor import config as inductor_config
+        inductor_config.fx_graph_cache = True
+        return torch.compile(self.net, dynamic=True)
 
     def inference(self, inputs):
-        with torch.no_grad():
+        with torch.inference_mode():
             infer = self.net(inputs)
         return infer
@@ -10,11 +10,12 @@ from pytorchocr.modeling.necks import build_neck
 from pytorchocr.modeling.heads import build_head
 
 class BaseModel(nn.Module):
-    def __init__(self, config, **kwargs):
+    def __init__(self, config, init_weights=True, **kwargs):
         """
         the module for OCR.
         args:
             config (dict): the super parameters for module.
+            init_weights (bool): run _initialize_weights, not needed when a checkpoint is loaded after.
         """
         super(BaseModel, self).__init__()
 
@@ -57,14 +58,18 @@ class BaseModel(nn.Module):
         # # build head, head is need for det, rec and cls
         if 'Head' not in config or config['Head'] is None:
             self.use_head = False
+            self.is_multihead = False
         else:
             self.use_head = True
+            # the name is read before the build to route multi head outputs in forward
+            self.is_multihead = config["Head"].get('name') == 'MultiHead'
             config["Head"]['in_channels'] = in_channels
             self.head = build_head(config["Head"], **kwargs)
 
         self.return_all_feats = config.get("return_all_feats", False)
 
-        self._initialize_weights()
+        if init_weights:
+            self._initialize_weights()
 
     def _initialize_weights(self):
         # weight initialization
@@ -87,6 +92,17 @@ class BaseModel(nn.Module):
 
 
     def forward(self, x):
+        if not self.return_all_feats:
+            # only the last output is returned, skip collecting the features
+            if self.use_transform:
+                x = self.transform(x)
+            if self.use_backbone:
+                x = self.backbone(x)
+            if self.use_neck:
+                x = self.neck(x)
+            if self.use_head:
+                x = self.head(x)
+            return x
         y = dict()
         if self.use_transform:
             x = self.transform(x)
@@ -107,19 +123,16 @@ class BaseModel(nn.Module):
         if self.use_head:
             x = self.head(x)
         # for multi head, save ctc neck out for udml
-        if isinstance(x, dict) and 'ctc_nect' in x.keys():
+        if self.is_multihead and isinstance(x, dict):
             y['neck_out'] = x['ctc_neck']
             y['head_out'] = x
         elif isinstance(x, dict):
             y.update(x)
         else:
             y["head_out"] = x
-        if self.return_all_feats:
-            if self.training:
-                return y
-            elif isinstance(x, dict):
-                return x
-            else:
-                return {final_name: x}
+        if self.training:
+            return y
+        elif isinstance(x, dict):
+            return x
         else:
-            return x
\ No newline at end of file
+            return {final_name: x}
\ No newline at end of file
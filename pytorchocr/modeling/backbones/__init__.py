@@ -12,55 +12,66 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import functools
+import importlib
+
 __all__ = ['build_backbone']
 
+# backbones used by both det and rec models
+SHARED_BACKBONES = {
+    'PPLCNetV3': ('.rec_lcnetv3', 'PPLCNetV3'),
+    'PPHGNet_small': ('.rec_hgnet', 'PPHGNet_small'),
+    'PPHGNetV2_B4': ('.rec_pphgnetv2', 'PPHGNetV2_B4'),
+}
+
+# backbone name -> (module, class) per model type, only the module of the
+# requested backbone is imported
+BACKBONES = {
+    'det': {
+        'MobileNetV3': ('.det_mobilenet_v3', 'MobileNetV3'),
+        'ResNet': ('.det_resnet', 'ResNet'),
+        'ResNet_vd': ('.det_resnet_vd', 'ResNet_vd'),
+        'ResNet_SAST': ('.det_resnet_vd_sast', 'ResNet_SAST'),
+        **SHARED_BACKBONES,
+    },
+    'rec': {
+        'MobileNetV1Enhance': ('.rec_mv1_enhance', 'MobileNetV1Enhance'),
+        'MobileNetV3': ('.rec_mobilenet_v3', 'MobileNetV3'),
+        'ResNet': ('.rec_resnet_vd', 'ResNet'),
+        'ResNetFPN': ('.rec_resnet_fpn', 'ResNetFPN'),
+        'MTB': ('.rec_nrtr_mtb', 'MTB'),
+        'ResNet31': ('.rec_resnet_31', 'ResNet31'),
+        'SVTRNet': ('.rec_svtrnet', 'SVTRNet'),
+        'ViTSTR': ('.rec_vitstr', 'ViTSTR'),
+        'DenseNet': ('.rec_densenet', 'DenseNet'),
+        **SHARED_BACKBONES,
+    },
+    'e2e': {
+        'ResNet': ('.e2e_resnet_vd_pg', 'ResNet'),
+    },
+    'table': {
+        'ResNet': ('.table_resnet_vd', 'ResNet'),
+        'MobileNetV3': ('.table_mobilenet_v3', 'MobileNetV3'),
+    },
+}
+BACKBONES['cls'] = BACKBONES['rec']
 
-def build_backbone(config, model_type):
-    if model_type == 'det':
-        from .det_mobilenet_v3 import MobileNetV3
-        from .det_resnet import ResNet
-        from .det_resnet_vd import ResNet_vd
-        from .det_resnet_vd_sast import ResNet_SAST
-        from .rec_lcnetv3 import PPLCNetV3
-        from .rec_hgnet import PPHGNet_small
-        from .rec_pphgnetv2 import PPHGNetV2_B4
-        support_dict = [
-            'MobileNetV3', 'ResNet', 'ResNet_vd', 'ResNet_SAST', 'PPLCNetV3', 'PPHGNet_small',
-            'PPHGNetV2_B4',
-        ]
-    elif model_type == 'rec' or model_type == 'cls':
-        from .rec_mobilenet_v3 import MobileNetV3
-        from .rec_resnet_vd import ResNet
-        from .rec_resnet_fpn import ResNetFPN
-        from .rec_mv1_enhance import MobileNetV1Enhance
-        from .rec_nrtr_mtb import MTB
-        from .rec_resnet_31 import ResNet31
-        from .rec_svtrnet import SVTRNet
-        from .rec_vitstr import ViTSTR
-        from .rec_densenet import DenseNet
-        from .rec_lcnetv3 import PPLCNetV3
-        from .rec_hgnet import PPHGNet_small
-        from .rec_pphgnetv2 import (
-            PPHGNetV2_B4,
-        )
-        support_dict = [
-            'MobileNetV1Enhance', 'MobileNetV3', 'ResNet', 'ResNetFPN', 'MTB',
-            'ResNet31', 'SVTRNet', 'ViTSTR', 'DenseNet', 'PPLCNetV3', 'PPHGNet_small',
-            'PPHGNetV2_B4'
-        ]
-    elif model_type == 'e2e':
-        from .e2e_resnet_vd_pg import ResNet
-        support_dict = ['ResNet']
-    elif model_type == "table":
-        from .table_resnet_vd import ResNet
-        from .table_mobilenet_v3 import MobileNetV3
-        support_dict = ["ResNet", "MobileNetV3"]
-    else:
-        raise NotImplementedError
 
-    module_name = config.pop('name')
+@functools.lru_cache(maxsize=None)
+def resolve_backbone(model_type, module_name):
+    if model_type not in BACKBONES:
+        raise NotImplementedError
+    support_dict = BACKBONES[model_type]
     assert module_name in support_dict, Exception(
         'when model typs is {}, backbone only support {}'.format(model_type,
-                                                                 support_dict))
-    module_class = eval(module_name)(**config)
-    return module_class
\ No newline at end of file
+                                                                 list(support_dict)))
+    module_path, class_name = support_dict[module_name]
+    return getattr(importlib.import_module(module_path, __name__), class_name)
+
+
+def build_backbone(config, model_type):
+    # config is left as is, 'name' is dropped from a copy of the kwargs
+    module_name = config['name']
+    kwargs = {k: v for k, v in config.items() if k != 'name'}
+    module_class = resolve_backbone(model_type, module_name)(**kwargs)
+    return module_class
@@ -44,8 +44,10 @@ def build_head(config, **kwargs):
 
     from .table_att_head import TableAttentionHead
 
-    module_name = config.pop('name')
+    # config is left as is, 'name' is dropped from a copy of the kwargs
+    module_name = config['name']
     assert module_name in support_dict, Exception('head only support {}'.format(
         support_dict))
-    module_class = eval(module_name)(**config, **kwargs)
+    head_kwargs = {k: v for k, v in config.items() if k != 'name'}
+    module_class = eval(module_name)(**head_kwargs, **kwargs)
     return module_class
\ No newline at end of file
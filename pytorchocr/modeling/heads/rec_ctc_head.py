@@ -41,13 +41,12 @@ class CTCHead(nn.Module):
             x = self.fc1(x)
             predicts = self.fc2(x)
 
+        if not self.training:
+            return F.softmax(predicts, dim=2)
+
         if self.return_feats:
             result = (x, predicts)
         else:
             result = predicts
 
-        if not self.training:
-            predicts = F.softmax(predicts, dim=2)
-            result = predicts
-
         return result
\ No newline at end of file
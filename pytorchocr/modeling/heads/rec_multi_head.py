@@ -1,7 +1,7 @@
 import torch
 import torch.nn as nn
 
-from pytorchocr.modeling.necks.rnn import Im2Seq, SequenceEncoder
+from pytorchocr.modeling.necks.rnn import SequenceEncoder
 from .rec_nrtr_head import Transformer
 from .rec_ctc_head import CTCHead
 from .rec_sar_head import SARHead
@@ -17,68 +17,86 @@ class FCTranspose(nn.Module):
         if self.only_transpose:
             return x.permute([0, 2, 1])
         else:
-            return self.fc(x.permute([0, 2, 1]))
+            # the linear reads the permuted tensor as one contiguous gemm input
+            return self.fc(x.permute([0, 2, 1]).contiguous())
 
 
 class MultiHead(nn.Module):
-    def __init__(self, in_channels, out_channels_list, **kwargs):
+    def __init__(self, in_channels, out_channels_list, head_list,
+                 use_channels_last=False, **kwargs):
         super().__init__()
-        self.head_list = kwargs.pop('head_list')
+        self.head_list = head_list
+        # run the ctc neck convs on NHWC cudnn kernels
+        self.use_channels_last = use_channels_last
 
         self.gtc_head = 'sar'
         assert len(self.head_list) >= 2
-        for idx, head_name in enumerate(self.head_list):
+        for head_name in self.head_list:
             name = list(head_name)[0]
-            if name == 'SARHead':
-                pass
-                # # sar head
-                # sar_args = self.head_list[idx][name]
-                # self.sar_head = eval(name)(in_channels=in_channels, \
-                #                            out_channels=out_channels_list['SARLabelDecode'], **sar_args)
-            elif name == 'NRTRHead':
-                pass
-                # gtc_args = self.head_list[idx][name]
-                # max_text_length = gtc_args.get('max_text_length', 25)
-                # nrtr_dim = gtc_args.get('nrtr_dim', 256)
-                # num_decoder_layers = gtc_args.get('num_decoder_layers', 4)
-                # self.before_gtc = nn.Sequential(
-                #     nn.Flatten(2), FCTranspose(in_channels, nrtr_dim))
-                # self.gtc_head = Transformer(
-                #     d_model=nrtr_dim,
-                #     nhead=nrtr_dim // 32,
-                #     num_encoder_layers=-1,
-                #     beam_size=-1,
-                #     num_decoder_layers=num_decoder_layers,
-                #     max_len=max_text_length,
-                #     dim_feedforward=nrtr_dim * 4,
-                #     out_channels=out_channels_list['NRTRLabelDecode'])
-            elif name == 'CTCHead':
-                # ctc neck
-                self.encoder_reshape = Im2Seq(in_channels)
-                neck_args = self.head_list[idx][name]['Neck']
-                encoder_type = neck_args.pop('name')
-                self.ctc_encoder = SequenceEncoder(in_channels=in_channels, \
-                                                   encoder_type=encoder_type, **neck_args)
-                # ctc head
-                head_args = self.head_list[idx][name].get('Head', {})
-                if head_args is None:
-                    head_args = {}
-                self.ctc_head = eval(name)(in_channels=self.ctc_encoder.out_channels, \
-                                           out_channels=out_channels_list['CTCLabelDecode'], **head_args)
-            else:
+            builder = self.HEAD_BUILDERS.get(name)
+            if builder is None:
                 raise NotImplementedError(
                     '{} is not supported in MultiHead yet'.format(name))
+            builder(self, in_channels, out_channels_list, head_name[name])
+
+    def _build_sar_head(self, in_channels, out_channels_list, sar_args):
+        pass
+        # # sar head
+        # self.sar_head = SARHead(in_channels=in_channels, \
+        #                         out_channels=out_channels_list['SARLabelDecode'], **sar_args)
+
+    def _build_nrtr_head(self, in_channels, out_channels_list, gtc_args):
+        pass
+        # max_text_length = gtc_args.get('max_text_length', 25)
+        # nrtr_dim = gtc_args.get('nrtr_dim', 256)
+        # num_decoder_layers = gtc_args.get('num_decoder_layers', 4)
+        # self.before_gtc = nn.Sequential(
+        #     nn.Flatten(2), FCTranspose(in_channels, nrtr_dim))
+        # self.gtc_head = Transformer(
+        #     d_model=nrtr_dim,
+        #     nhead=nrtr_dim // 32,
+        #     num_encoder_layers=-1,
+        #     beam_size=-1,
+        #     num_decoder_layers=num_decoder_layers,
+        #     max_len=max_text_length,
+        #     dim_feedforward=nrtr_dim * 4,
+        #     out_channels=out_channels_list['NRTRLabelDecode'])
+
+    def _build_ctc_head(self, in_channels, out_channels_list, ctc_args):
+        # ctc neck
+        encoder_type = ctc_args['Neck']['name']
+        neck_args = {k: v for k, v in ctc_args['Neck'].items() if k != 'name'}
+        self.ctc_encoder = SequenceEncoder(in_channels=in_channels, \
+                                           encoder_type=encoder_type, **neck_args)
+        # ctc head
+        head_args = ctc_args.get('Head', {})
+        if head_args is None:
+            head_args = {}
+        self.ctc_head = CTCHead(in_channels=self.ctc_encoder.out_channels, \
+                                out_channels=out_channels_list['CTCLabelDecode'], **head_args)
+
+    # head name -> builder, looked up once per configured head
+    HEAD_BUILDERS = {
+        'SARHead': _build_sar_head,
+        'NRTRHead': _build_nrtr_head,
+        'CTCHead': _build_ctc_head,
+    }
 
     def forward(self, x, data=None):
+        if self.use_channels_last and x.is_cuda:
+            x = x.contiguous(memory_format=torch.channels_last)
         ctc_encoder = self.ctc_encoder(x)
         ctc_out = self.ctc_head(ctc_encoder)
+        # eval mode
+        if not self.training:
+            return ctc_out
+        return self._forward_train(x, ctc_encoder, ctc_out, data)
+
+    def _forward_train(self, x, ctc_encoder, ctc_out, data):
         head_out = dict()
         head_out['ctc'] = ctc_out
         head_out['res'] = ctc_out
         head_out['ctc_neck'] = ctc_encoder
-        # eval mode
-        if not self.training:
-            return ctc_out
         if self.gtc_head == 'sar':
             sar_out = self.sar_head(x, data[1:])['res']
             head_out['sar'] = sar_out
@@ -149,18 +149,20 @@ class Transformer(nn.Module):
             memory = torch.squeeze(src, 2).permute(2, 0, 1)
         dec_seq = torch.full((bs, 1), 2, dtype=torch.int64)
         dec_prob = torch.full((bs, 1), 1., dtype=torch.float32)
+        # the decoder keys and values of the decoded tokens and of memory are cached,
+        # every step only runs the decoder on the newest token
+        incremental_state = {}
         for len_dec_seq in range(1, 25):
-            dec_seq_embed = self.embedding(dec_seq).permute(1, 0, 2)
-            dec_seq_embed = self.positional_encoding(dec_seq_embed)
-            tgt_mask = self.generate_square_subsequent_mask(
-                dec_seq_embed.shape[0])
+            dec_seq_embed = self.embedding(dec_seq[:, -1:]).permute(1, 0, 2)
+            dec_seq_embed = self.positional_encoding(dec_seq_embed, offset=len_dec_seq - 1)
             output = self.decoder(
                 dec_seq_embed,
                 memory,
-                tgt_mask=tgt_mask,
+                tgt_mask=None,
                 memory_mask=None,
                 tgt_key_padding_mask=None,
-                memory_key_padding_mask=None)
+                memory_key_padding_mask=None,
+                incremental_state=incremental_state)
             dec_output = output.permute(1, 0, 2)
             dec_output = dec_output[:, -1, :]
             tgt_word_prj = self.tgt_word_prj(dec_output)
@@ -406,7 +408,8 @@ class TransformerDecoder(nn.Module):
                 tgt_mask=None,
                 memory_mask=None,
                 tgt_key_padding_mask=None,
-                memory_key_padding_mask=None):
+                memory_key_padding_mask=None,
+                incremental_state=None):
         """Pass the inputs (and mask) through the decoder layer in turn.
 
         Args:
@@ -416,6 +419,7 @@ class TransformerDecoder(nn.Module):
             memory_mask: the mask for the memory sequence (optional).
             tgt_key_padding_mask: the mask for the tgt keys per batch (optional).
             memory_key_padding_mask: the mask for the memory keys per batch (optional).
+            incremental_state: dict caching the previous time steps of every layer (optional).
         """
         output = tgt
         for i in range(self.num_layers):
@@ -425,7 +429,8 @@ class TransformerDecoder(nn.Module):
                 tgt_mask=tgt_mask,
                 memory_mask=memory_mask,
                 tgt_key_padding_mask=tgt_key_padding_mask,
-                memory_key_padding_mask=memory_key_padding_mask)
+                memory_key_padding_mask=memory_key_padding_mask,
+                incremental_state=None if incremental_state is None else incremental_state.setdefault(i, {}))
 
         return output
 
@@ -549,7 +554,8 @@ class TransformerDecoderLayer(nn.Module):
                 tgt_mask=None,
                 memory_mask=None,
                 tgt_key_padding_mask=None,
-                memory_key_padding_mask=None):
+                memory_key_padding_mask=None,
+                incremental_state=None):
         """Pass the inputs (and mask) through the decoder layer.
 
         Args:
@@ -559,14 +565,21 @@ class TransformerDecoderLayer(nn.Module):
             memory_mask: the mask for the memory sequence (optional).
             tgt_key_padding_mask: the mask for the tgt keys per batch (optional).
             memory_key_padding_mask: the mask for the memory keys per batch (optional).
+            incremental_state: dict caching the previous time steps of this layer (optional),
+                tgt then only holds the new time steps.
 
         """
+        self_attn_state = memory_attn_state = None
+        if incremental_state is not None:
+            self_attn_state = incremental_state.setdefault('self_attn', {})
+            memory_attn_state = incremental_state.setdefault('multihead_attn', {})
         tgt2 = self.self_attn(
             tgt,
             tgt,
             tgt,
             attn_mask=tgt_mask,
-            key_padding_mask=tgt_key_padding_mask)
+            key_padding_mask=tgt_key_padding_mask,
+            incremental_state=self_attn_state)
         tgt = tgt + self.dropout1(tgt2)
         tgt = self.norm1(tgt)
         tgt2 = self.multihead_attn(
@@ -574,7 +587,9 @@ class TransformerDecoderLayer(nn.Module):
             memory,
             memory,
             attn_mask=memory_mask,
-            key_padding_mask=memory_key_padding_mask)
+            key_padding_mask=memory_key_padding_mask,
+            incremental_state=memory_attn_state,
+            static_kv=True)
         tgt = tgt + self.dropout2(tgt2)
         tgt = self.norm2(tgt)
 
@@ -628,17 +643,18 @@ class PositionalEncoding(nn.Module):
         pe = pe.permute(1, 0, 2)
         self.register_buffer('pe', pe)
 
-    def forward(self, x):
+    def forward(self, x, offset=0):
         """Inputs of forward function
         Args:
             x: the sequence fed to the positional encoder model (required).
+            offset: the position of the first element of x (default=0).
         Shape:
             x: [sequence length, batch size, embed dim]
             output: [sequence length, batch size, embed dim]
         Examples:
             >>> output = pos_encoder(x)
         """
-        x = x + self.pe[:x.shape[0], :]
+        x = x + self.pe[offset:offset + x.shape[0], :]
         return self.dropout(x)
 
 
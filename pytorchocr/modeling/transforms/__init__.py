@@ -23,8 +23,9 @@ def build_transform(config):
 
     support_dict = ['TPS', 'STN_ON', 'TSRN', 'TBSRN']
 
-    module_name = config.pop('name')
+    # config is left as is, 'name' is dropped from a copy of the kwargs
+    module_name = config['name']
     assert module_name in support_dict, Exception(
         'transform only support {}'.format(support_dict))
-    module_class = eval(module_name)(**config)
+    module_class = eval(module_name)(**{k: v for k, v in config.items() if k != 'name'})
     return module_class
\ No newline at end of file
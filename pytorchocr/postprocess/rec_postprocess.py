@@ -149,22 +149,22 @@ class BaseRecLabelDecode(object):
         ignored_tokens = self.get_ignored_tokens()
         batch_size = len(text_index)
         for batch_idx in range(batch_size):
-            char_list = []
-            conf_list = []
-            for idx in range(len(text_index[batch_idx])):
-                if text_index[batch_idx][idx] in ignored_tokens:
-                    continue
-                if is_remove_duplicate:
-                    # only for predict
-                    if idx > 0 and text_index[batch_idx][idx - 1] == text_index[
-                            batch_idx][idx]:
-                        continue
-                char_list.append(self.character[int(text_index[batch_idx][
-                    idx])])
-                if text_prob is not None:
-                    conf_list.append(text_prob[batch_idx][idx])
-                else:
-                    conf_list.append(1)
+            # collapse with array masks instead of a per-step python loop
+            sample_index = np.asarray(text_index[batch_idx])
+            selection = np.ones(len(sample_index), dtype=bool)
+            if is_remove_duplicate:
+                # only for predict
+                selection[1:] = sample_index[1:] != sample_index[:-1]
+            for ignored_token in ignored_tokens:
+                selection &= sample_index != ignored_token
+            char_list = [
+                self.character[int(text_id)]
+                for text_id in sample_index[selection]
+            ]
+            if text_prob is not None:
+                conf_list = np.asarray(text_prob[batch_idx])[selection]
+            else:
+                conf_list = [1] * len(char_list)
             text = ''.join(char_list)
             result_list.append((text, np.mean(conf_list)))
         return result_list
@@ -185,9 +185,13 @@ class CTCLabelDecode(BaseRecLabelDecode):
 
     def __call__(self, preds, label=None, return_word_box=False, *args, **kwargs):
         if isinstance(preds, torch.Tensor):
-            preds = preds.numpy()
-        preds_idx = preds.argmax(axis=2)
-        preds_prob = preds.max(axis=2)
+            # reduce on the tensor's device, only [B, T] goes back to the host
+            preds_prob, preds_idx = preds.detach().max(dim=2)
+            preds_prob = preds_prob.cpu().numpy()
+            preds_idx = preds_idx.cpu().numpy()
+        else:
+            preds_idx = preds.argmax(axis=2)
+            preds_prob = preds.max(axis=2)
         text = self.decode(
             preds_idx,
             preds_prob,
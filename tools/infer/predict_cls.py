@@ -34,7 +34,7 @@ class TextClassifier(BaseOCRV20):
         self.weights_path = args.cls_model_path
         self.yaml_path = args.cls_yaml_path
         network_config = utility.AnalysisConfig(self.weights_path, self.yaml_path)
-        super(TextClassifier, self).__init__(network_config, **kwargs)
+        super(TextClassifier, self).__init__(network_config, init_weights=False, **kwargs)
 
         self.cls_image_shape = [int(v) for v in args.cls_image_shape.split(",")]
 
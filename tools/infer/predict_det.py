@@ -123,11 +123,14 @@ class TextDetector(BaseOCRV20):
         self.weights_path = args.det_model_path
         self.yaml_path = args.det_yaml_path
         network_config = utility.AnalysisConfig(self.weights_path, self.yaml_path)
-        super(TextDetector, self).__init__(network_config, **kwargs)
+        super(TextDetector, self).__init__(network_config, init_weights=False, **kwargs)
         self.load_pytorch_weights(self.weights_path)
         self.net.eval()
         if self.use_gpu:
             self.net.cuda()
+        self.det_forward = self.net
+        if args.det_use_compile:
+            self.det_forward = self.compile_net()
 
     def order_points_clockwise(self, pts):
         """
@@ -200,7 +203,7 @@ class TextDetector(BaseOCRV20):
             inp = torch.from_numpy(img)
             if self.use_gpu:
                 inp = inp.cuda()
-            outputs = self.net(inp)
+            outputs = self.det_forward(inp)
 
         preds = {}
         if self.det_algorithm == "EAST":
@@ -67,7 +67,7 @@ class TextE2E(BaseOCRV20):
         self.weights_path = args.e2e_model_path
         self.yaml_path = args.e2e_yaml_path
         network_config = utility.AnalysisConfig(self.weights_path, self.yaml_path)
-        super(TextE2E, self).__init__(network_config, **kwargs)
+        super(TextE2E, self).__init__(network_config, init_weights=False, **kwargs)
 
         self.load_pytorch_weights(self.weights_path)
         self.net.eval()
@@ -130,8 +130,7 @@ if __name__ == "__main__":
     count = 0
     total_time = 0
     draw_img_save = "./inference_results"
-    if not os.path.exists(draw_img_save):
-        os.makedirs(draw_img_save)
+    os.makedirs(draw_img_save, exist_ok=True)
     for image_file in image_file_list:
         img, flag = check_and_read_gif(image_file)
         if not flag:
@@ -9,10 +9,12 @@ import cv2
 import numpy as np
 import math
 import time
+import itertools
 import torch
 from pytorchocr.base_ocr_v20 import BaseOCRV20
 import tools.infer.pytorchocr_utility as utility
 from pytorchocr.postprocess import build_post_process
+from pytorchocr.postprocess.rec_postprocess import CTCLabelDecode
 from pytorchocr.utils.utility import get_image_file_list, check_and_read_gif
 
 
@@ -91,17 +93,20 @@ class TextRecognizer(BaseOCRV20):
 
         self.out_channels = self.get_out_channels(weights)
         if self.rec_algorithm == 'NRTR':
-            self.out_channels = list(weights.values())[-1].numpy().shape[0]
+            self.out_channels = next(reversed(weights.values())).shape[0]
         elif self.rec_algorithm == 'SAR':
-            self.out_channels = list(weights.values())[-3].numpy().shape[0]
+            self.out_channels = next(itertools.islice(reversed(weights.values()), 2, None)).shape[0]
 
         kwargs['out_channels'] = self.out_channels
-        super(TextRecognizer, self).__init__(network_config, **kwargs)
+        super(TextRecognizer, self).__init__(network_config, init_weights=False, **kwargs)
 
         self.load_state_dict(weights)
         self.net.eval()
         if self.use_gpu:
             self.net.cuda()
+        self.rec_forward = self.net
+        if args.rec_use_compile:
+            self.rec_forward = self.compile_net()
 
     def resize_norm_img(self, img, max_wh_ratio):
         imgC, imgH, imgW = self.rec_image_shape
@@ -430,10 +435,13 @@ class TextRecognizer(BaseOCRV20):
                     inp = torch.from_numpy(norm_img_batch)
                     if self.use_gpu:
                         inp = inp.cuda()
-                    prob_out = self.net(inp)
+                    prob_out = self.rec_forward(inp)
 
                 if isinstance(prob_out, list):
                     preds = [v.cpu().numpy() for v in prob_out]
+                elif isinstance(self.postprocess_op, CTCLabelDecode):
+                    # ctc decode takes the argmax on device
+                    preds = prob_out
                 else:
                     preds = prob_out.cpu().numpy()
 
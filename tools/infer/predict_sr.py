@@ -49,7 +49,7 @@ class TextSR(BaseOCRV20):
         print(network_config)
         weights = self.read_pytorch_weights(self.weights_path)
 
-        super(TextSR, self).__init__(network_config, **kwargs)
+        super(TextSR, self).__init__(network_config, init_weights=False, **kwargs)
 
         self.load_state_dict(weights)
         self.net.eval()
@@ -25,6 +25,7 @@ def init_args():
     parser.add_argument("--det_limit_side_len", type=float, default=960)
     parser.add_argument("--det_limit_type", type=str, default='max')
     parser.add_argument("--det_box_type", type=str, default="quad")
+    parser.add_argument("--det_use_compile", type=str2bool, default=False)
 
     # DB parmas
     parser.add_argument("--det_db_thresh", type=float, default=0.3)
@@ -71,6 +72,7 @@ def init_args():
     parser.add_argument("--drop_score", type=float, default=0.5)
     parser.add_argument("--limited_max_width", type=int, default=1280)
     parser.add_argument("--limited_min_width", type=int, default=16)
+    parser.add_argument("--rec_use_compile", type=str2bool, default=False)
 
     parser.add_argument(
         "--vis_font_path", type=str,